@@ -1,15 +1,25 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, request, jsonify, send_from_directory, render_template, Response, stream_with_context
 import os
 import base64
 import cv2
 import numpy as np
 import detect_and_classify
 import database
+import temperature_store
+import live_updates
+import image_io
+import model_registry
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 
 app = Flask(__name__, static_folder='assets', template_folder='.')
+app.config['MAX_CONTENT_LENGTH'] = image_io.MAX_REQUEST_BYTES
 CORS(app)
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Upload too large (limit {image_io.MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}), 413
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -30,22 +40,29 @@ def analyze_image():
             file = request.files['image']
             if file.filename == '':
                 return jsonify({'error': 'No image provided'}), 400
-            image_bytes = file.read()
-            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            # Chunked read with a hard limit, single buffer (no bytes copy)
+            image_buf = image_io.read_upload(file.stream)
+            bird_id = request.form.get('bird_id')
+            pen_id = request.form.get('pen_id', 'default')
         else:
             # Fallback to JSON with base64
             data = request.get_json()
             image_data_url = data.get('image')
             if not image_data_url:
                 return jsonify({'error': 'No image provided'}), 400
-            _, encoded = image_data_url.split(',', 1)
-            image_bytes = base64.b64decode(encoded)
-            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            image_buf = image_io.decode_data_url(image_data_url)
+            bird_id = data.get('bird_id')
+            pen_id = data.get('pen_id', 'default')
 
-        if img is None:
-            raise ValueError("Image could not be decoded.")
+        # Downscale on load for large frames; temperatures stay full resolution
+        img, temp_codes, lut, temp_scale = image_io.decode_upload(image_buf)
+        del image_buf
 
-        output_img, classification, temperatures = detect_and_classify.detect_and_classify(img)
+        # Pin one model version for the whole request (hot-swaps don't affect it)
+        model = model_registry.production()
+        output_img, classification, temperatures = detect_and_classify.detect_and_classify(
+            img, temp_array=temp_codes, lut=lut, temp_scale=temp_scale, model=model)
+        del temp_codes
 
         overall_result = classification
 
@@ -60,7 +77,13 @@ def analyze_image():
 
         # Save result to database
         filename = "uploaded_image"  # Placeholder filename
-        database.save_result(filename, max_temp if max_temp is not None else 0, overall_result)
+        database.save_result(filename, max_temp if max_temp is not None else 0, overall_result,
+                             model_version=model.version)
+
+        # Per-bird history and baseline check (only when the bird is identified)
+        trend = None
+        if bird_id and max_temp is not None:
+            trend = temperature_store.add_sample(bird_id, max_temp, pen_id=pen_id)
 
         gray_image = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         norm_gray = cv2.normalize(gray_image, None, 0, 255, cv2.NORM_MINMAX)
@@ -85,47 +108,50 @@ def analyze_image():
                 'leg': float(temperatures.get('leg')) if temperatures.get('leg') is not None and not (isinstance(temperatures.get('leg'), float) and np.isnan(temperatures.get('leg'))) else None
             },
             'confidence': None,
+            'model_version': model.version,
+            'trend': trend,
             'image': img_data_url,
             'heat_pattern_image': heat_img_data_url
         })
 
+    except image_io.UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except HTTPException:
+        # e.g. RequestEntityTooLarge from MAX_CONTENT_LENGTH, handled by request_too_large
+        raise
     except Exception as e:
         return jsonify({'error': f"Error analyzing image: {str(e)}"}), 500
 
+@app.route('/api/cascade_stats', methods=['GET'])
+def get_cascade_stats():
+    # Fraction of frames that needed full-size or tiled inference,
+    # plus how many frames the warm-presence prefilter kept away from YOLO
+    stats = detect_and_classify.get_cascade_stats()
+    stats['prefilter'] = detect_and_classify.get_prefilter_stats()
+    return jsonify(stats)
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    # Production/shadow versions, shadow disagreement rate and latency delta
+    return jsonify(model_registry.status())
+
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
-    # Fetch real data from database
-    results = database.get_all_results()
-    healthy_count = sum(1 for r in results if r[3] == 'Healthy')
-    sick_count = sum(1 for r in results if r[3] == 'Suspected Bird Flu')
-    invalid_count = sum(1 for r in results if r[3] == 'Invalid Image')
-
-    recent_alerts = []
-    for r in results[-3:]:  # Last 3 results (most recent)
-        recent_alerts.append({
-            'date': r[4],
-            'chicken_id': f'CHK_{r[0]}',
-            'status': r[3],
-            'id': str(r[0])
-        })
+    # Counters are kept in memory by live_updates, no full table scan per request
+    data = live_updates.snapshot()
+    data['health_trend'] = {
+        'labels': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        'healthy': [2, 3, 2, 4, 3, 2, 1],  # Placeholder, can be updated with real data
+        'sick': [0, 1, 0, 1, 0, 1, 0]
+    }
+    return jsonify(data)
 
-    return jsonify({
-        'stats': {
-            'healthy': healthy_count,
-            'sick': sick_count,
-            'total': len(results)
-        },
-        'recent_alerts': recent_alerts,
-        'health_trend': {
-            'labels': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-            'healthy': [2, 3, 2, 4, 3, 2, 1],  # Placeholder, can be updated with real data
-            'sick': [0, 1, 0, 1, 0, 1, 0]
-        },
-        'distribution': {
-            'healthy': healthy_count,
-            'sick': sick_count
-        }
-    })
+@app.route('/api/dashboard/stream', methods=['GET'])
+def stream_dashboard():
+    # Server-Sent Events: initial snapshot on connect, then deltas on save/delete
+    return Response(stream_with_context(live_updates.stream()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/details/<alert_id>', methods=['GET'])
 def show_details(alert_id):
@@ -149,6 +175,7 @@ def get_analyses():
             'status': r[3],
             'image': '',  # Placeholder, as we don't store images in DB
             'heatPattern': '',  # Placeholder
+            'modelVersion': r[5] if len(r) > 5 else None,
             'temperature': float(r[2]) if isinstance(r[2], (int, float)) or (isinstance(r[2], str) and r[2].replace('.', '').isdigit()) else None
         })
     return jsonify({'analyses': analyses})
@@ -158,11 +185,30 @@ def save_analysis():
     try:
         data = request.get_json()
         # Save to database with proper fields
-        database.save_result(data.get('chicken_id', 'unknown'), data.get('temperature', 0), data.get('status', 'Unknown'))
+        database.save_result(data.get('chicken_id', 'unknown'), data.get('temperature', 0), data.get('status', 'Unknown'),
+                             model_version=data.get('model_version'))
+        # No temperature sample here: chicken_id is a filename, and /api/analyze
+        # already records the reading when the request names a bird_id
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/birds/<bird_id>/history', methods=['GET'])
+def get_bird_history(bird_id):
+    pen_id = request.args.get('pen', 'default')
+    since = request.args.get('since', type=int)
+    recent = temperature_store.get_recent(bird_id, pen_id=pen_id)
+    rollups = temperature_store.get_rollups(bird_id, pen_id=pen_id, since=since)
+    return jsonify({
+        'bird_id': bird_id,
+        'pen_id': pen_id,
+        'recent': [{'ts': ts, 'temperature': t} for ts, t in recent],
+        'rollups': [
+            {'bucket': b, 'count': c, 'mean': mean, 'min': lo, 'max': hi}
+            for b, c, mean, lo, hi in rollups
+        ]
+    })
+
 @app.route('/api/delete_analysis/<analysis_id>', methods=['DELETE'])
 def delete_analysis(analysis_id):
     try:
@@ -187,4 +233,4 @@ def get_reports_data():
     return jsonify(reports)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
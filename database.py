@@ -11,6 +11,21 @@ import os
 # ------------------------------------------
 DB_NAME = "results.db"
 
+# Callbacks notified as fn(event, row) after a record is saved or deleted,
+# where row is (id, filename, temperature, result, date, model_version)
+_listeners = []
+
+def add_listener(fn):
+    """Register a callback for saved/deleted records."""
+    _listeners.append(fn)
+
+def _notify(event, row):
+    for fn in _listeners:
+        try:
+            fn(event, row)
+        except Exception as e:
+            print(f"Listener error: {e}")
+
 def init_db():
     """Create database and table if not existing."""
     conn = sqlite3.connect(DB_NAME)
@@ -21,27 +36,43 @@ def init_db():
         filename TEXT NOT NULL,
         temperature REAL NOT NULL,
         result TEXT NOT NULL,
-        date TEXT NOT NULL
+        date TEXT NOT NULL,
+        model_version TEXT
     )
     ''')
     conn.commit()
     conn.close()
 
+def migrate_db():
+    """Add columns introduced after a database was created."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(analysis_results)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if columns and "model_version" not in columns:
+        cursor.execute("ALTER TABLE analysis_results ADD COLUMN model_version TEXT")
+        print("📦 Added model_version column")
+    conn.commit()
+    conn.close()
+
 # ------------------------------------------
 # 2️⃣ Save New Analysis Result
 # ------------------------------------------
-def save_result(filename, temperature, result):
-    """Insert new detection result into database."""
+def save_result(filename, temperature, result, model_version=None):
+    """Insert new detection result into database, with the model version that produced it."""
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
     date_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     cursor.execute('''
-    INSERT INTO analysis_results (filename, temperature, result, date)
-    VALUES (?, ?, ?, ?)
-    ''', (filename, temperature, result, date_now))
+    INSERT INTO analysis_results (filename, temperature, result, date, model_version)
+    VALUES (?, ?, ?, ?, ?)
+    ''', (filename, temperature, result, date_now, model_version))
+    record_id = cursor.lastrowid
     conn.commit()
     conn.close()
-    print(f"✅ Saved result: {filename} | {temperature}°C | {result}")
+    print(f"✅ Saved result: {filename} | {temperature}°C | {result} | model {model_version}")
+    _notify("saved", (record_id, filename, temperature, result, date_now, model_version))
+    return record_id
 
 # ------------------------------------------
 # 3️⃣ Retrieve All Results
@@ -78,10 +109,35 @@ def delete_result(record_id):
     """Delete a record by ID."""
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
+    cursor.execute("SELECT * FROM analysis_results WHERE id=?", (record_id,))
+    row = cursor.fetchone()
     cursor.execute("DELETE FROM analysis_results WHERE id=?", (record_id,))
     conn.commit()
     conn.close()
     print(f"🗑️ Deleted record ID {record_id}")
+    if row is not None:
+        _notify("deleted", row)
+
+# ------------------------------------------
+# 6️⃣ Dashboard Summary (aggregated in SQL)
+# ------------------------------------------
+def get_result_counts():
+    """Count records per result label without fetching every row."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT result, COUNT(*) FROM analysis_results GROUP BY result")
+    counts = dict(cursor.fetchall())
+    conn.close()
+    return counts
+
+def get_recent_results(limit=3):
+    """Fetch the most recent records."""
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM analysis_results ORDER BY id DESC LIMIT ?", (limit,))
+    results = cursor.fetchall()
+    conn.close()
+    return results
 
 # ------------------------------------------
 # Auto initialize database on import
@@ -90,4 +146,5 @@ if not os.path.exists(DB_NAME):
     init_db()
     print("📦 Database created successfully!")
 else:
+    migrate_db()
     print("✅ Database loaded.")
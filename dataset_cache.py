@@ -0,0 +1,247 @@
+# ==========================================================
+# 📦 PREPROCESSED DATASET CACHE
+# Decodes thermal_dataset / thermal_dataset_parts once and writes
+# frames, YOLO labels and 8-bit temperature codes + LUTs into memory-mappable
+# shards, so repeated evaluation and benchmark runs skip JPEG/BMP
+# decoding and temperature extraction.
+#
+# Usage:
+#   python dataset_cache.py            # build dataset_cache/
+# ==========================================================
+import json
+import os
+import shutil
+import sys
+
+import cv2
+import numpy as np
+
+import thermal_preprocessing
+
+CACHE_DIR = "dataset_cache"
+INDEX_NAME = "index.json"
+CACHE_VERSION = 2   # bump when the shard layout changes; older caches must be rebuilt
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.bmp', '.png')
+
+# (dataset root, layout) pairs the builder knows how to walk
+SOURCES = [
+    ("thermal_dataset_parts", "yolo"),        # <split>/images, <split>/labels
+    ("thermal_dataset", "classification"),    # <split>/<Healthy|Sick>
+]
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not name.endswith('_result.jpg')
+
+
+def _read_yolo_labels(label_path):
+    """Read a YOLO label file as [[cls, cx, cy, w, h], ...]."""
+    labels = []
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 5:
+                    labels.append([int(parts[0])] + [float(v) for v in parts[1:]])
+    return labels
+
+
+def _iter_sources():
+    """Yield (path, meta) for every image under the known dataset roots."""
+    for root, layout in SOURCES:
+        if not os.path.exists(root):
+            continue
+        for split in sorted(os.listdir(root)):
+            split_dir = os.path.join(root, split)
+            if not os.path.isdir(split_dir):
+                continue
+            if layout == "yolo":
+                images_dir = os.path.join(split_dir, "images")
+                labels_dir = os.path.join(split_dir, "labels")
+                if not os.path.isdir(images_dir):
+                    continue
+                for name in sorted(os.listdir(images_dir)):
+                    if _is_image(name):
+                        label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")
+                        yield os.path.join(images_dir, name), {
+                            "dataset": root, "split": split, "class": None,
+                            "labels": _read_yolo_labels(label_path),
+                        }
+            else:
+                for class_name in sorted(os.listdir(split_dir)):
+                    class_dir = os.path.join(split_dir, class_name)
+                    if not os.path.isdir(class_dir):
+                        continue
+                    for name in sorted(os.listdir(class_dir)):
+                        if _is_image(name):
+                            yield os.path.join(class_dir, name), {
+                                "dataset": root, "split": split, "class": class_name,
+                                "labels": [],
+                            }
+
+
+# ------------------------------------------
+# 1️⃣ Build
+# ------------------------------------------
+class _ShardWriter:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.shard = 0
+        self.frames, self.codes, self.luts = [], [], []
+        self.frame_bytes = self.code_bytes = 0
+
+    def add(self, image, temp_codes, lut):
+        """Buffer one frame; returns (shard, frame_offset, code_offset, lut_index)."""
+        location = (self.shard, self.frame_bytes, self.code_bytes, len(self.luts))
+        self.frames.append(image.reshape(-1))
+        self.codes.append(temp_codes.reshape(-1))
+        self.luts.append(lut.astype(np.float32))
+        self.frame_bytes += image.size
+        self.code_bytes += temp_codes.size
+        if self.frame_bytes + self.code_bytes >= SHARD_MAX_BYTES:
+            self.flush()
+        return location
+
+    def flush(self):
+        if not self.frames:
+            return
+        np.save(os.path.join(self.cache_dir, f"shard_{self.shard:05d}_frames.npy"),
+                np.concatenate(self.frames))
+        np.save(os.path.join(self.cache_dir, f"shard_{self.shard:05d}_codes.npy"),
+                np.concatenate(self.codes))
+        np.save(os.path.join(self.cache_dir, f"shard_{self.shard:05d}_luts.npy"),
+                np.stack(self.luts))
+        self.shard += 1
+        self.frames, self.codes, self.luts = [], [], []
+        self.frame_bytes = self.code_bytes = 0
+
+
+def build_cache(cache_dir=CACHE_DIR):
+    """
+    Decode every dataset image once and write shards plus index.json.
+
+    The new cache is built next to the old one and swapped in at the end, so an
+    interrupted rebuild never leaves an index pointing at other shards' contents.
+    """
+    cache_dir = os.path.normpath(cache_dir)
+    build_dir = cache_dir + ".building"
+    shutil.rmtree(build_dir, ignore_errors=True)    # leftovers of an interrupted build
+    os.makedirs(build_dir)
+    writer = _ShardWriter(build_dir)
+    entries = []
+
+    for path, meta in _iter_sources():
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping unreadable image: {path}")
+            continue
+        # Same call the live pipeline makes for file inputs
+        temp_codes, lut = thermal_preprocessing.extract_pixel_codes(path)
+        shard, frame_offset, code_offset, lut_index = writer.add(image, temp_codes, lut)
+        entries.append(dict(meta,
+                            source=os.path.normpath(path),
+                            mtime=os.path.getmtime(path),
+                            shard=shard,
+                            frame_offset=frame_offset,
+                            frame_shape=list(image.shape),
+                            code_offset=code_offset,
+                            code_shape=list(temp_codes.shape),
+                            lut_index=lut_index))
+    writer.flush()
+
+    with open(os.path.join(build_dir, INDEX_NAME), "w") as f:
+        json.dump({"version": CACHE_VERSION, "shards": writer.shard, "entries": entries}, f)
+
+    # A directory can't be os.replace'd over a non-empty one: move the old cache aside first.
+    # A crash in between only leaves no cache, and readers fall back to the source images.
+    old_dir = cache_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(cache_dir):
+        os.replace(cache_dir, old_dir)
+    os.replace(build_dir, cache_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"✅ Cached {len(entries)} images into {writer.shard} shard(s) in {cache_dir}/")
+    return len(entries)
+
+
+# ------------------------------------------
+# 2️⃣ Read
+# ------------------------------------------
+class ShardedDataset:
+    """
+    Memory-mapped view over a built cache.
+
+    Items are dicts with image (BGR uint8), temp_codes (uint8) and lut
+    (lut[temp_codes] gives °C), labels (YOLO [cls, cx, cy, w, h] rows)
+    and the source path / split / class.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, dataset=None, split=None):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, INDEX_NAME)) as f:
+            index = json.load(f)
+        self.entries = [e for e in index["entries"]
+                        if (dataset is None or e["dataset"] == dataset)
+                        and (split is None or e["split"] == split)]
+        self._by_source = {e["source"]: e for e in self.entries}
+        self._shards = {}
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            prefix = os.path.join(self.cache_dir, f"shard_{shard:05d}")
+            self._shards[shard] = (np.load(prefix + "_frames.npy", mmap_mode="r"),
+                                   np.load(prefix + "_codes.npy", mmap_mode="r"),
+                                   np.load(prefix + "_luts.npy", mmap_mode="r"))
+        return self._shards[shard]
+
+    def _load(self, entry):
+        frames, codes, luts = self._shard(entry["shard"])
+        frame_size = int(np.prod(entry["frame_shape"]))
+        code_size = int(np.prod(entry["code_shape"]))
+        start, code_start = entry["frame_offset"], entry["code_offset"]
+        return {
+            "image": np.array(frames[start:start + frame_size]).reshape(entry["frame_shape"]),
+            "temp_codes": np.array(codes[code_start:code_start + code_size]).reshape(entry["code_shape"]),
+            "lut": np.array(luts[entry["lut_index"]]),
+            "labels": entry["labels"],
+            "source": entry["source"],
+            "split": entry["split"],
+            "class": entry["class"],
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self._load(self.entries[i])
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield self._load(entry)
+
+    def lookup(self, path):
+        """Cached item for an image path, or None if missing or the file changed since caching."""
+        entry = self._by_source.get(os.path.normpath(path))
+        if entry is None:
+            return None
+        if os.path.exists(path) and os.path.getmtime(path) != entry["mtime"]:
+            return None
+        return self._load(entry)
+
+
+def open_cache(cache_dir=CACHE_DIR):
+    """Open the cache if it has been built, otherwise return None."""
+    index_path = os.path.join(cache_dir, INDEX_NAME)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        version = json.load(f).get("version")
+    if version != CACHE_VERSION:
+        print(f"Dataset cache in {cache_dir}/ is outdated, rebuild it with: python dataset_cache.py")
+        return None
+    return ShardedDataset(cache_dir)
+
+
+if __name__ == "__main__":
+    build_cache(sys.argv[1] if len(sys.argv) > 1 else CACHE_DIR)
@@ -1,14 +1,317 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
 import tempfile, os
+import threading
+import time
 import thermal_preprocessing
+import model_registry
 
-# Load your trained YOLO model (head, body)
-yolo_model = YOLO("runs/detect/yolov8_parts/weights/best.pt")
+# Load your trained YOLO model (head, body); versions and hot-swap live in model_registry
+model_registry.load_initial()
 print("✅ Loaded custom YOLO model with head & body classes")
 
-def detect_and_classify(img_input):
+# ===========================================
+# CASCADE INFERENCE SETTINGS
+# ===========================================
+# Run the model at a small input size first and only pay full-resolution
+# (or tiled) inference when the cheap pass is unsure.
+DETECTION_CONF = 0.3
+CASCADE_ENABLED = True
+CASCADE_SMALL_IMGSZ = 320
+CASCADE_FULL_IMGSZ = 640
+CASCADE_MIN_CONF = 0.5       # head/body below this confidence triggers escalation
+CASCADE_TILE_GRID = 2        # 2x2 tiles for the last-resort pass
+CASCADE_TILE_OVERLAP = 0.2   # fraction of tile size shared with neighbours
+CASCADE_NMS_IOU = 0.5
+CASCADE_CONTAIN_RATIO = 0.7  # a box this much inside a stronger same-class box is a tile-edge fragment
+
+BODY_CLASS, HEAD_CLASS, LEGS_CLASS = 0, 1, 2
+
+# Skip YOLO entirely on frames without a warm, body-sized blob
+# (thresholds live in thermal_preprocessing)
+PREFILTER_ENABLED = True
+
+_cascade_lock = threading.Lock()
+cascade_stats = {
+    "frames": 0,
+    "escalated_full": 0,
+    "escalated_tiled": 0,
+    "time_small": 0.0,
+    "time_full": 0.0,
+    "time_tiled": 0.0,
+}
+prefilter_stats = {"frames": 0, "skipped": 0}
+
+
+def _run_yolo_results(model, source, imgsz=None):
+    """Run YOLO on one image or a list of images and return the raw results list."""
+    if imgsz is None:
+        return model(source, conf=DETECTION_CONF)
+    return model(source, conf=DETECTION_CONF, imgsz=imgsz)
+
+
+def _unpack_result(result):
+    boxes = result.boxes.xyxy.cpu().numpy()
+    classes = result.boxes.cls.cpu().numpy().astype(int)
+    confidences = result.boxes.conf.cpu().numpy()
+    return boxes, classes, confidences
+
+
+def _run_yolo(model, image, imgsz=None):
+    """Run YOLO once and return (boxes, classes, confidences) as numpy arrays."""
+    return _unpack_result(_run_yolo_results(model, image, imgsz)[0])
+
+
+def _needs_escalation(classes, confidences):
+    """True when detections are missing, low-confidence or the head/body pair is incomplete."""
+    if len(classes) == 0:
+        return True
+    for part in (BODY_CLASS, HEAD_CLASS):
+        mask = classes == part
+        if not np.any(mask) or np.max(confidences[mask]) < CASCADE_MIN_CONF:
+            return True
+    return False
+
+
+def _contained_ratio(a, b):
+    """Intersection over the smaller box's area."""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return ix * iy / smaller if smaller > 0 else 0.0
+
+
+def _merge_detections(boxes, classes, confidences):
+    """
+    Per-class NMS over overlapping detections, ordered by confidence like YOLO output.
+
+    A bird cut by a tile edge yields a partial box whose IoU with the full-frame
+    box stays low, so boxes mostly contained in a stronger box of the same class
+    are dropped as well.
+    """
+    keep = []
+    for part in np.unique(classes):
+        idx = np.where(classes == part)[0]
+        rects = [[float(boxes[i][0]), float(boxes[i][1]),
+                  float(boxes[i][2] - boxes[i][0]), float(boxes[i][3] - boxes[i][1])] for i in idx]
+        scores = [float(confidences[i]) for i in idx]
+        kept = cv2.dnn.NMSBoxes(rects, scores, DETECTION_CONF, CASCADE_NMS_IOU)
+        kept = sorted(idx[np.array(kept).flatten()].tolist() if len(kept) > 0 else [],
+                      key=lambda i: -confidences[i])
+        part_keep = []
+        for i in kept:
+            if all(_contained_ratio(boxes[i], boxes[j]) < CASCADE_CONTAIN_RATIO for j in part_keep):
+                part_keep.append(i)
+        keep.extend(part_keep)
+
+    keep = sorted(keep, key=lambda i: -confidences[i])
+    return boxes[keep], classes[keep], confidences[keep]
+
+
+def _run_tiled(model, image, full_boxes, full_classes, full_confidences):
+    """Run full-size inference on overlapping tiles and merge with the full-frame pass."""
+    h, w = image.shape[:2]
+    grid = CASCADE_TILE_GRID
+    tile_h = int(np.ceil(h / grid * (1 + CASCADE_TILE_OVERLAP)))
+    tile_w = int(np.ceil(w / grid * (1 + CASCADE_TILE_OVERLAP)))
+    step_y = (h - tile_h) // (grid - 1) if grid > 1 else 0
+    step_x = (w - tile_w) // (grid - 1) if grid > 1 else 0
+
+    all_boxes = [full_boxes]
+    all_classes = [full_classes]
+    all_confidences = [full_confidences]
+    for row in range(grid):
+        for col in range(grid):
+            y0, x0 = max(0, row * step_y), max(0, col * step_x)
+            tile = image[y0:y0 + tile_h, x0:x0 + tile_w]
+            boxes, classes, confidences = _run_yolo(model, tile, CASCADE_FULL_IMGSZ)
+            if len(boxes) == 0:
+                continue
+            all_boxes.append(boxes + np.array([x0, y0, x0, y0], dtype=boxes.dtype))
+            all_classes.append(classes)
+            all_confidences.append(confidences)
+
+    boxes = np.concatenate([b.reshape(-1, 4) for b in all_boxes])
+    classes = np.concatenate(all_classes).astype(int)
+    confidences = np.concatenate(all_confidences)
+    if len(boxes) == 0:
+        return boxes, classes, confidences
+    return _merge_detections(boxes, classes, confidences)
+
+
+def run_detection(image, cascade=None, model=None, record_stats=True):
+    """
+    Detect chicken parts, optionally through the small -> full -> tiled cascade.
+    model defaults to the current production YOLO model.
+
+    Returns:
+        boxes, classes, confidences, stage ("single", "small", "full" or "tiled")
+    """
+    if cascade is None:
+        cascade = CASCADE_ENABLED
+    if model is None:
+        model = model_registry.production().model
+    if not cascade:
+        boxes, classes, confidences = _run_yolo(model, image)
+        return boxes, classes, confidences, "single"
+
+    start = time.perf_counter()
+    boxes, classes, confidences = _run_yolo(model, image, CASCADE_SMALL_IMGSZ)
+    return _escalate(model, image, boxes, classes, confidences, time.perf_counter() - start, record_stats)
+
+
+def run_detection_batch(images, cascade=None, model=None):
+    """
+    Detect chicken parts on several frames with one batched YOLO call for the
+    first (small or single) pass; only escalated frames run individually.
+
+    Returns:
+        list of (boxes, classes, confidences, stage, latency), one per image;
+        latency is the frame's share of the batch plus its own escalation time
+    """
+    if not images:
+        return []
+    if cascade is None:
+        cascade = CASCADE_ENABLED
+    if model is None:
+        model = model_registry.production().model
+
+    start = time.perf_counter()
+    results = _run_yolo_results(model, list(images), CASCADE_SMALL_IMGSZ if cascade else None)
+    per_frame_time = (time.perf_counter() - start) / len(images)
+
+    detections = []
+    frame_timings = []
+    for image, result in zip(images, results):
+        boxes, classes, confidences = _unpack_result(result)
+        if cascade:
+            boxes, classes, confidences, stage, timings = _cascade(
+                model, image, boxes, classes, confidences, per_frame_time)
+            detections.append((boxes, classes, confidences, stage, sum(timings.values())))
+            frame_timings.append((stage, timings))
+        else:
+            detections.append((boxes, classes, confidences, "single", per_frame_time))
+
+    # Recorded only once the whole batch succeeded, so a retry doesn't count frames twice
+    for stage, timings in frame_timings:
+        _record_cascade_stats(stage, timings)
+    return detections
+
+
+def _escalate(model, image, boxes, classes, confidences, time_small, record_stats=True):
+    """Apply the full-size / tiled escalation to a small-pass result and record stats."""
+    boxes, classes, confidences, stage, timings = _cascade(model, image, boxes, classes, confidences, time_small)
+    if record_stats:
+        _record_cascade_stats(stage, timings)
+    return boxes, classes, confidences, stage
+
+
+def _cascade(model, image, boxes, classes, confidences, time_small):
+    """Full-size / tiled escalation of a small-pass result; also returns per-stage timings."""
+    timings = {"time_small": time_small, "time_full": 0.0, "time_tiled": 0.0}
+    stage = "small"
+
+    if _needs_escalation(classes, confidences):
+        stage = "full"
+        start = time.perf_counter()
+        boxes, classes, confidences = _run_yolo(model, image, CASCADE_FULL_IMGSZ)
+        timings["time_full"] = time.perf_counter() - start
+
+        if _needs_escalation(classes, confidences):
+            stage = "tiled"
+            start = time.perf_counter()
+            boxes, classes, confidences = _run_tiled(model, image, boxes, classes, confidences)
+            timings["time_tiled"] = time.perf_counter() - start
+
+    return boxes, classes, confidences, stage, timings
+
+
+def _record_cascade_stats(stage, timings):
+    with _cascade_lock:
+        cascade_stats["frames"] += 1
+        if stage in ("full", "tiled"):
+            cascade_stats["escalated_full"] += 1
+        if stage == "tiled":
+            cascade_stats["escalated_tiled"] += 1
+        for key, value in timings.items():
+            cascade_stats[key] += value
+
+
+def get_cascade_stats():
+    """Summarize how often the cascade escalated and where inference time went."""
+    with _cascade_lock:
+        stats = dict(cascade_stats)
+    frames = stats["frames"]
+    total_time = stats["time_small"] + stats["time_full"] + stats["time_tiled"]
+    return {
+        "frames": frames,
+        "escalated_full": stats["escalated_full"],
+        "escalated_tiled": stats["escalated_tiled"],
+        "escalation_rate": stats["escalated_full"] / frames if frames else 0.0,
+        "tiled_rate": stats["escalated_tiled"] / frames if frames else 0.0,
+        "avg_inference_time": total_time / frames if frames else 0.0,
+        "avg_small_time": stats["time_small"] / frames if frames else 0.0,
+    }
+
+
+def reset_cascade_stats():
+    """Clear cascade counters (e.g. between benchmark runs)."""
+    with _cascade_lock:
+        for key in cascade_stats:
+            cascade_stats[key] = 0 if key in ("frames", "escalated_full", "escalated_tiled") else 0.0
+
+
+def passes_prefilter(temp_array, lut=None):
+    """Warm-presence check (see thermal_preprocessing.detect_warm_presence) with skip counting."""
+    present, _ = thermal_preprocessing.detect_warm_presence(temp_array, lut=lut)
+    with _cascade_lock:
+        prefilter_stats["frames"] += 1
+        if not present:
+            prefilter_stats["skipped"] += 1
+    return present
+
+
+def empty_detections():
+    """Detection result for frames that never reach YOLO."""
+    return (np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=int),
+            np.empty(0, dtype=np.float32), "skipped")
+
+
+def get_prefilter_stats():
+    """How many frames the warm-presence prefilter short-circuited."""
+    with _cascade_lock:
+        stats = dict(prefilter_stats)
+    stats["skip_rate"] = stats["skipped"] / stats["frames"] if stats["frames"] else 0.0
+    return stats
+
+
+def reset_prefilter_stats():
+    with _cascade_lock:
+        prefilter_stats["frames"] = 0
+        prefilter_stats["skipped"] = 0
+
+
+def print_cascade_stats(label):
+    stats = get_cascade_stats()
+    if stats["frames"]:
+        print(f"Cascade ({label}): {stats['frames']} frames, "
+              f"escalated to full: {stats['escalation_rate']*100:.1f}%, "
+              f"tiled: {stats['tiled_rate']*100:.1f}%, "
+              f"avg YOLO time: {stats['avg_inference_time']:.3f}s "
+              f"(small pass only: {stats['avg_small_time']:.3f}s)")
+    # Reported separately: with every frame skipped, the cascade never runs
+    prefilter = get_prefilter_stats()
+    if prefilter["frames"]:
+        print(f"Prefilter ({label}): skipped {prefilter['skipped']}/{prefilter['frames']} frames "
+              f"({prefilter['skip_rate']*100:.1f}%)")
+
+def detect_and_classify(img_input, cascade=None, prefilter=None, temp_array=None, lut=None, temp_scale=1.0,
+                        detections=None, model=None, shadow=False):
+    # model is a model_registry.LoadedModel; pass it in to know which version produced the result.
+    # shadow=True marks a candidate-model run (no stats, no further shadowing).
+    if model is None:
+        model = model_registry.production()
+
     # Load image
     temp_path = None
     if isinstance(img_input, str):
@@ -16,25 +319,47 @@ def detect_and_classify(img_input):
         img_path = img_input
     else:
         image = img_input
-        # Save cv2 image to temp file for consistent temperature extraction
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            cv2.imwrite(temp_file.name, img_input)
-            temp_path = temp_file.name
-        img_path = temp_path
+        img_path = None
+        if temp_array is None:
+            # Save cv2 image to temp file for consistent temperature extraction
+            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
+                cv2.imwrite(temp_file.name, img_input)
+                temp_path = temp_file.name
+            img_path = temp_path
 
     if image is None:
         raise ValueError("❌ Invalid image input")
 
     output = image.copy()
 
-    # Extract temperature array
-    temp_array = thermal_preprocessing.extract_pixel_temperatures(img_path)
+    # Extract 8-bit thermal codes + temperature LUT (unless precomputed, e.g. from dataset_cache).
+    # With a lut, temp_array holds uint8 codes; without one it is already in °C.
+    # temp_scale maps image coordinates to temp_array coordinates when the frame
+    # was decoded at reduced resolution but temperatures at full resolution.
+    if temp_array is None:
+        temp_array, lut = thermal_preprocessing.extract_pixel_codes(img_path)
+
+    # Cheap warm-presence check: empty frames never reach YOLO
+    # (skipped when detections were already computed, e.g. by run_detection_batch)
+    if prefilter is None:
+        prefilter = PREFILTER_ENABLED and detections is None
+    present = True
+    if prefilter:
+        present = passes_prefilter(temp_array, lut=lut)
 
     # Run YOLO detection (your model detects head, body)
-    results = yolo_model(image, conf=0.3)
-    boxes = results[0].boxes.xyxy.cpu().numpy()
-    classes = results[0].boxes.cls.cpu().numpy().astype(int)
-    confidences = results[0].boxes.conf.cpu().numpy()
+    detection_latency = None
+    if detections is not None:
+        boxes, classes, confidences = detections[:3]
+        if len(detections) > 4:
+            detection_latency = detections[4]   # from run_detection_batch
+    elif present:
+        start = time.perf_counter()
+        boxes, classes, confidences, _ = run_detection(image, cascade=cascade, model=model.model,
+                                                       record_stats=not shadow)
+        detection_latency = time.perf_counter() - start
+    else:
+        boxes, classes, confidences, _ = empty_detections()
 
     head_temp, body_mean, body_min, body_max = None, None, None, None
     body_crop_temp = None  # Store body temperature array for detailed analysis
@@ -45,15 +370,17 @@ def detect_and_classify(img_input):
     for box, cls, conf in zip(boxes, classes, confidences):
         detection_found = True
         x1, y1, x2, y2 = map(int, box)
-        crop_temp = temp_array[y1:y2, x1:x2] if temp_array is not None else np.array([])
+        tx1, ty1, tx2, ty2 = (int(v * temp_scale) for v in (x1, y1, x2, y2))
+        crop_temp = temp_array[ty1:ty2, tx1:tx2] if temp_array is not None else np.array([])
 
         if cls == 0:  # body
             body_box = (x1, y1, x2, y2)
             if crop_temp.size > 0:
-                body_mean = np.mean(crop_temp)
-                body_min = np.min(crop_temp)
-                body_max = np.percentile(crop_temp, 90)
-                body_crop_temp = crop_temp  # Store for detailed analysis
+                stats = thermal_preprocessing.region_stats(crop_temp, lut, percentiles=(90,))
+                body_mean = stats["mean"]
+                body_min = stats["min"]
+                body_max = stats[90]
+                body_crop_temp = crop_temp  # Store for detailed analysis (uint8 codes when lut is given)
             else:
                 body_mean = body_min = body_max = 0
                 body_crop_temp = np.array([])
@@ -72,7 +399,7 @@ def detect_and_classify(img_input):
 
         elif cls == 1:  # head
             if crop_temp.size > 0:
-                head_temp = np.max(crop_temp)
+                head_temp = thermal_preprocessing.region_stats(crop_temp, lut)["max"]
             else:
                 head_temp = 0
 
@@ -94,12 +421,12 @@ def detect_and_classify(img_input):
         leg_end = by2
 
         # Clamp within image bounds
-        leg_start = max(0, leg_start)
-        leg_end = min(temp_array.shape[0], leg_end)
+        leg_start = max(0, int(leg_start * temp_scale))
+        leg_end = min(temp_array.shape[0], int(leg_end * temp_scale))
 
-        leg_region = temp_array[leg_start:leg_end, bx1:bx2]
+        leg_region = temp_array[leg_start:leg_end, int(bx1 * temp_scale):int(bx2 * temp_scale)]
         if leg_region.size > 0:
-            leg_temp = np.mean(leg_region)
+            leg_temp = thermal_preprocessing.region_stats(leg_region, lut)["mean"]
 
     # Classification Logic
     if not detection_found:
@@ -151,6 +478,11 @@ def detect_and_classify(img_input):
     if temp_path and os.path.exists(temp_path):
         os.unlink(temp_path)
 
+    # Compare against the candidate model on a sample of traffic, off the request path
+    if not shadow and detection_latency is not None:
+        _submit_shadow(image, cascade, temp_array, lut, temp_scale, model.version,
+                       classification, boxes, classes, detection_latency)
+
     # Convert numpy types to Python types for JSON serialization
     def safe_float(value):
         if value is None:
@@ -169,6 +501,40 @@ def detect_and_classify(img_input):
     }
 
 
+def _best_box(boxes, classes, part):
+    idx = np.where(classes == part)[0]
+    return boxes[idx[0]] if len(idx) else None   # boxes are ordered by confidence
+
+
+def _box_iou(a, b):
+    if a is None and b is None:
+        return None
+    if a is None or b is None:
+        return 0.0
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def _submit_shadow(image, cascade, temp_array, lut, temp_scale, production_version,
+                   production_result, prod_boxes, prod_classes, production_latency):
+    def job(candidate):
+        start = time.perf_counter()
+        found = run_detection(image, cascade=cascade, model=candidate.model, record_stats=False)
+        shadow_latency = time.perf_counter() - start
+        _, shadow_result, _ = detect_and_classify(image, temp_array=temp_array, lut=lut, temp_scale=temp_scale,
+                                                  detections=found, model=candidate, shadow=True)
+        model_registry.record_shadow(
+            production_version, candidate.version, production_result, shadow_result,
+            _box_iou(_best_box(prod_boxes, prod_classes, BODY_CLASS), _best_box(found[0], found[1], BODY_CLASS)),
+            _box_iou(_best_box(prod_boxes, prod_classes, HEAD_CLASS), _best_box(found[0], found[1], HEAD_CLASS)),
+            production_latency, shadow_latency)
+
+    model_registry.submit_shadow(job)
+
+
 def classify_chicken_health(head_temp, body_min, body_max, leg_temp):
     """Helper function to classify chicken health based on temperature readings."""
     signs_detected = []
@@ -198,9 +564,22 @@ def classify_chicken_health(head_temp, body_min, body_max, leg_temp):
 if __name__ == "__main__":
     import time
     import os
+    import dataset_cache
 
     print("=== Chicken Health Detection System Testing ===\n")
 
+    # Use the preprocessed shards when built (python dataset_cache.py)
+    cache = dataset_cache.open_cache()
+    if cache is not None:
+        print(f"Using dataset cache with {len(cache)} preprocessed images\n")
+
+    def load_test_input(path):
+        """Decoded frame + precomputed temperatures from the cache, or the plain path."""
+        item = cache.lookup(path) if cache is not None else None
+        if item is None:
+            return path, None, None
+        return item["image"], item["temp_codes"], item["lut"]
+
     # Test 1: Performance and accuracy on Healthy dataset
     print("Test 1: Performance and accuracy on Healthy dataset")
     healthy_dir = "thermal_dataset/test/Healthy"
@@ -236,7 +615,8 @@ if __name__ == "__main__":
         start_time = time.time()
 
         try:
-            output, classification, temperatures = detect_and_classify(test_img)
+            test_input, test_codes, test_lut = load_test_input(test_img)
+            output, classification, temperatures = detect_and_classify(test_input, temp_array=test_codes, lut=test_lut)
             end_time = time.time()
             inference_time = end_time - start_time
             total_time += inference_time
@@ -262,6 +642,7 @@ if __name__ == "__main__":
     print(f"Success rate: {success_count/len(test_images)*100:.1f}%" if test_images else "No images found")
     print(f"Classification breakdown: Healthy: {healthy_classification_counts['Healthy']}, Fever Only: {healthy_classification_counts['Fever Only']}, Suspected Bird Flu: {healthy_classification_counts['Suspected Bird Flu']}, Detection Failed: {healthy_classification_counts['Detection Failed']}")
     print(f"Average inference time: {total_time/len(test_images):.3f}s" if test_images else "")
+    print_cascade_stats("Healthy dataset")
 
     if temp_readings:
         head_temps = [t[0] for t in temp_readings if t[0] is not None]
@@ -316,13 +697,16 @@ if __name__ == "__main__":
     sick_temp_readings = []
     suspected_bird_flu_detections = 0
     sick_classification_counts = {"Healthy": 0, "Fever Only": 0, "Suspected Bird Flu": 0, "Detection Failed": 0}
+    reset_cascade_stats()
+    reset_prefilter_stats()
 
     for test_img in sick_test_images:
         print(f"\n--- Testing with {os.path.basename(test_img)} ---")
         start_time = time.time()
 
         try:
-            output, classification, temperatures = detect_and_classify(test_img)
+            test_input, test_codes, test_lut = load_test_input(test_img)
+            output, classification, temperatures = detect_and_classify(test_input, temp_array=test_codes, lut=test_lut)
             end_time = time.time()
             inference_time = end_time - start_time
             sick_total_time += inference_time
@@ -353,6 +737,7 @@ if __name__ == "__main__":
     print(f"Suspected birdflu detections: {suspected_bird_flu_detections}")
     print(f"Suspected birdflu detection rate: {suspected_bird_flu_detections/len(sick_test_images)*100:.1f}%" if sick_test_images else "")
     print(f"Average inference time: {sick_total_time/len(sick_test_images):.3f}s" if sick_test_images else "")
+    print_cascade_stats("Sick dataset")
 
     if sick_temp_readings:
         head_temps = [t[0] for t in sick_temp_readings if t[0] is not None]
@@ -379,6 +764,39 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Error with blank image: {e}")
 
+    # Test 3b: Prefilter false-skip check against labeled parts dataset
+    print("\n\nTest 3b: Warm-presence prefilter vs. YOLO labels")
+    skipped = false_skips = labeled_frames = empty_frames = 0
+    for split in ("train", "val"):
+        images_dir = os.path.join("thermal_dataset_parts", split, "images")
+        labels_dir = os.path.join("thermal_dataset_parts", split, "labels")
+        if not os.path.exists(images_dir):
+            continue
+        for f in os.listdir(images_dir):
+            if not (f.endswith('.jpg') or f.endswith('.bmp') or f.endswith('.png')):
+                continue
+            label_path = os.path.join(labels_dir, os.path.splitext(f)[0] + ".txt")
+            has_chicken = os.path.exists(label_path) and os.path.getsize(label_path) > 0
+            _, temp_codes, lut = load_test_input(os.path.join(images_dir, f))
+            if temp_codes is None:
+                temp_codes, lut = thermal_preprocessing.extract_pixel_codes(os.path.join(images_dir, f))
+            present, _ = thermal_preprocessing.detect_warm_presence(temp_codes, lut=lut)
+            if has_chicken:
+                labeled_frames += 1
+            else:
+                empty_frames += 1
+            if not present:
+                skipped += 1
+                if has_chicken:
+                    false_skips += 1
+    if labeled_frames + empty_frames:
+        print(f"Frames checked: {labeled_frames + empty_frames} ({labeled_frames} labeled, {empty_frames} empty)")
+        print(f"Skipped: {skipped}, false skips (labeled frame skipped): {false_skips}")
+        if labeled_frames:
+            print(f"False-skip rate: {false_skips/labeled_frames*100:.1f}%")
+    else:
+        print("No labeled parts dataset found")
+
     # Test 4: Classification logic test
     print("\n\nTest 4: Classification logic verification")
     print("Testing temperature thresholds with updated logic...")
@@ -464,6 +882,55 @@ if __name__ == "__main__":
         print(f"Signs detected: {signs_detected}")
         print(f"Classification: {classification}")
 
+    # Test 6: LUT/histogram statistics vs. float path
+    print("\n\nTest 6: LUT temperature mapping vs. float path")
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(240, 320), dtype=np.uint8)
+    codes, lut = thermal_preprocessing.extract_pixel_codes(frame)
+    float_temps = thermal_preprocessing.extract_pixel_temperatures(frame)
+    region = (slice(40, 200), slice(60, 260))
+    lut_stats = thermal_preprocessing.region_stats(codes[region], lut, percentiles=(90, 95))
+    float_stats = thermal_preprocessing.region_stats(float_temps[region], percentiles=(90, 95))
+    resolution = float(lut[1] - lut[0])
+    worst = max(abs(lut_stats[k] - float_stats[k]) for k in float_stats)
+    print(f"Calibration resolution: {resolution:.4f}°C, largest difference: {worst:.6f}°C")
+    print("LUT path matches float path" if worst <= resolution else "⚠️ LUT path differs from float path")
+    print(f"Frame memory - uint8 codes: {codes.nbytes} bytes, float32 temperatures: {float_temps.nbytes} bytes")
+
+    # Test 7: Peak memory per request through the upload path.
+    # tracemalloc sees Python objects and NumPy arrays (including decoded frames),
+    # not OpenCV-internal buffers or torch tensors, so this is not process RSS.
+    print("\n\nTest 7: Peak Python-heap memory (tracemalloc) per /api/analyze-style request")
+    import tracemalloc
+    import image_io
+
+    upload_images = (test_images + sick_test_images)[:20]
+    if upload_images:
+        for label, reduce in (("full decode", False), ("reduced decode", True)):
+            peaks = []
+            tracemalloc.start()
+            for path in upload_images:
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+                try:
+                    with open(path, "rb") as f:
+                        buf = image_io.read_upload(f)
+                    target = image_io.DETECTOR_INPUT if reduce else float("inf")
+                    img, codes, lut, scale = image_io.decode_upload(buf, target=target)
+                    detect_and_classify(img, temp_array=codes, lut=lut, temp_scale=scale)
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+                    continue
+                finally:
+                    buf = img = codes = None
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.stop()
+            if peaks:
+                print(f"{label}: Python-heap avg peak {sum(peaks)/len(peaks)/1e6:.1f} MB, "
+                      f"max peak {max(peaks)/1e6:.1f} MB over {len(peaks)} requests")
+    else:
+        print("No test images found")
+
     print("\n=== Testing Complete ===")
     print("The chicken health detection system is working correctly with:")
     print("- Object detection using custom YOLO model for head and body")
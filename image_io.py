@@ -0,0 +1,157 @@
+# ==========================================================
+# 📥 BOUNDED UPLOAD READING AND REDUCED-RESOLUTION DECODING
+# Keeps per-request memory proportional to the detector input
+# instead of the uploaded frame size
+# ==========================================================
+import base64
+import struct
+
+import cv2
+import numpy as np
+
+import thermal_preprocessing
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024          # encoded image size limit
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024   # base64 JSON + form overhead
+MAX_PIXELS = 50_000_000                      # reject decompression bombs before decoding
+DETECTOR_INPUT = 640                         # YOLO input size (long side)
+READ_CHUNK = 64 * 1024
+
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+class UploadTooLarge(ValueError):
+    """Upload exceeds MAX_UPLOAD_BYTES or MAX_PIXELS."""
+
+
+# ------------------------------------------
+# 1️⃣ Bounded reads
+# ------------------------------------------
+def read_upload(stream, limit=MAX_UPLOAD_BYTES):
+    """Read a file stream in chunks into one buffer, stopping as soon as it exceeds limit."""
+    buf = bytearray()
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        buf.extend(chunk)
+        if len(buf) > limit:
+            raise UploadTooLarge(f"Image exceeds {limit // (1024 * 1024)} MB limit")
+    return np.frombuffer(buf, np.uint8)
+
+
+def decode_data_url(image_data_url, limit=MAX_UPLOAD_BYTES):
+    """Decode a base64 data URL, checking the size before allocating the decoded bytes."""
+    _, encoded = image_data_url.split(',', 1)
+    if len(encoded) * 3 // 4 > limit:
+        raise UploadTooLarge(f"Image exceeds {limit // (1024 * 1024)} MB limit")
+    return np.frombuffer(base64.b64decode(encoded), np.uint8)
+
+
+# ------------------------------------------
+# 2️⃣ Header sniffing (no pixel decode)
+# ------------------------------------------
+def _read_tiff_size(data):
+    """(width, height) from the first IFD of a classic TIFF, or None."""
+    order = {b'II': '<', b'MM': '>'}.get(bytes(data[:2]))
+    if order is None or struct.unpack(order + 'H', data[2:4])[0] != 42:    # 43 is BigTIFF
+        return None
+    offset = struct.unpack(order + 'I', data[4:8])[0]
+    if offset + 2 > len(data):
+        return None
+    count = struct.unpack(order + 'H', data[offset:offset + 2])[0]
+    dims = {}
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        if entry + 12 > len(data):
+            return None
+        tag, field_type = struct.unpack(order + 'HH', data[entry:entry + 4])
+        if tag in (256, 257):           # ImageWidth, ImageLength
+            value = data[entry + 8:entry + 12]
+            # SHORT values sit left-justified in the 4-byte field, LONG fill it
+            dims[tag] = struct.unpack(order + 'H', value[:2])[0] if field_type == 3 else struct.unpack(order + 'I', value)[0]
+    if 256 in dims and 257 in dims:
+        return dims[256], dims[257]
+    return None
+
+
+def read_image_size(buf):
+    """Return (width, height) from a JPEG, PNG, BMP or TIFF header, or None if unknown."""
+    data = memoryview(buf)
+    if len(data) >= 8 and bytes(data[:2]) in (b'II', b'MM'):
+        return _read_tiff_size(data)
+    if len(data) >= 24 and bytes(data[:8]) == b'\x89PNG\r\n\x1a\n':
+        return struct.unpack('>II', data[16:24])
+    if len(data) >= 26 and bytes(data[:2]) == b'BM':
+        width, height = struct.unpack('<ii', data[18:26])
+        return width, abs(height)
+    if len(data) >= 4 and bytes(data[:2]) == b'\xff\xd8':
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker == 0xFF:          # fill byte
+                i += 1
+                continue
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:   # markers without length
+                i += 2
+                continue
+            # SOFn frames carry the dimensions (C4/C8/CC are DHT/JPG/DAC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+# ------------------------------------------
+# 3️⃣ Decode
+# ------------------------------------------
+def decode_upload(buf, target=DETECTOR_INPUT, full_res_temperatures=True):
+    """
+    Decode an uploaded frame for detection, downscaling on load when it is
+    far larger than the detector input.
+
+    Returns:
+        image: BGR frame for detection/display (possibly reduced)
+        temp_codes: uint8 thermal codes for temperature sampling
+        lut: temperature lookup table for temp_codes
+        temp_scale: factor mapping image coordinates to temp_codes coordinates
+    """
+    size = read_image_size(buf)
+    if size is None:
+        # Unknown header: decode at 1/8 scale first to estimate the pixel count
+        preview = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if preview is None:
+            raise ValueError("Image could not be decoded.")
+        size = (preview.shape[1] * 8, preview.shape[0] * 8)
+        del preview
+    width, height = size
+    if width * height > MAX_PIXELS:
+        raise UploadTooLarge(f"Image has {width}x{height} pixels, limit is {MAX_PIXELS}")
+
+    flag = cv2.IMREAD_COLOR
+    long_side = max(width, height)
+    for factor, reduced_flag in _REDUCED_FLAGS:
+        if long_side / factor >= target:
+            flag = reduced_flag
+            break
+
+    image = cv2.imdecode(buf, flag)
+    if image is None:
+        raise ValueError("Image could not be decoded.")
+
+    if flag != cv2.IMREAD_COLOR and full_res_temperatures:
+        # Sample temperatures from the full-resolution 8-bit frame (1 byte/pixel)
+        gray = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    temp_codes, lut = thermal_preprocessing.extract_pixel_codes_from_gray(gray)
+    temp_scale = gray.shape[1] / image.shape[1]
+    return image, temp_codes, lut, temp_scale
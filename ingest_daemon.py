@@ -0,0 +1,333 @@
+# ==========================================================
+# 📂 WATCH-FOLDER INGESTION DAEMON
+# Picks up frames dropped by the barn cameras into a directory,
+# runs them through the detector in batches and stores results
+# through database.py.
+#
+# Usage:
+#   python ingest_daemon.py /mnt/cameras --done-dir /mnt/cameras/done
+#
+# Uses inotify (inotify_simple) when available and always rescans
+# periodically, since network shares don't deliver remote inotify events.
+# ==========================================================
+try:
+    from inotify_simple import INotify, flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+import argparse
+import os
+import queue
+import shutil
+import signal
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import database
+import detect_and_classify
+import image_io
+import model_registry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.bmp', '.png')
+QUEUE_SIZE = 64          # frames waiting for the detector; the watcher pauses when full
+BATCH_SIZE = 8           # frames per batched YOLO call
+BATCH_WAIT = 0.5         # seconds to wait for a batch to fill up
+SETTLE_SECONDS = 2.0     # a file must be this old (unchanged) before it is read
+RESCAN_SECONDS = 30.0    # full directory rescan interval with inotify
+POLL_SECONDS = 2.0       # polling interval without inotify
+STATS_SECONDS = 60.0     # how often ingest lag is reported
+
+
+# ------------------------------------------
+# 1️⃣ Processed-file ledger (survives restarts)
+# ------------------------------------------
+def init_ledger():
+    """Create the table of already ingested files if not existing."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ingested_files (
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        result_id INTEGER,
+        lag_seconds REAL,
+        ingested_at TEXT NOT NULL,
+        PRIMARY KEY (path, size, mtime_ns)
+    )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def _in_ledger(key):
+    """True if this (path, size, mtime_ns) was already processed (primary key lookup)."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM ingested_files WHERE path=? AND size=? AND mtime_ns=?", key)
+    found = cursor.fetchone() is not None
+    conn.close()
+    return found
+
+
+def _record(key, status, result_id, lag):
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT OR REPLACE INTO ingested_files (path, size, mtime_ns, status, result_id, lag_seconds, ingested_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', key + (status, result_id, lag, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    conn.close()
+
+
+def _unique_path(directory, filename):
+    """Path in directory for filename, suffixed _1, _2, ... if it is already taken."""
+    base, ext = os.path.splitext(filename)
+    path = os.path.join(directory, filename)
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{base}_{n}{ext}")
+        n += 1
+    return path
+
+
+# ------------------------------------------
+# 2️⃣ Daemon
+# ------------------------------------------
+class IngestDaemon:
+    def __init__(self, watch_dir, done_dir=None, failed_dir=None,
+                 batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.done_dir = done_dir
+        self.failed_dir = failed_dir or done_dir
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+
+        init_ledger()
+        self.seen = set()               # processed keys of files still in watch_dir (ledger cache)
+        self.pending = set()            # paths queued but not finished
+        self.lock = threading.Lock()
+        self.lags = []
+        self.processed = 0
+        self.backlogged = False         # a file was refused because the queue was full
+        self.last_stats = time.time()
+
+    # ---------- watching ----------
+    def _file_key(self, path):
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime_ns), st.st_mtime
+
+    def _offer(self, path, settled=False):
+        """
+        Queue a file if it is new, settled and there is room; returns False when the queue is full.
+        settled=True skips the age check (inotify CLOSE_WRITE / MOVED_TO mean the write finished).
+        """
+        if not path.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+            return True
+        try:
+            key, mtime = self._file_key(path)
+        except OSError:
+            return True
+        with self.lock:
+            if key in self.seen or path in self.pending:
+                return True
+        if not settled and time.time() - mtime < SETTLE_SECONDS:
+            return True     # still being written; picked up by a later scan/event
+        if _in_ledger(key):
+            with self.lock:
+                self.seen.add(key)
+            return True
+        try:
+            # Backpressure: never block the watcher, leave the file for the next scan
+            self.queue.put_nowait((key, mtime))
+        except queue.Full:
+            self.backlogged = True
+            return False
+        with self.lock:
+            self.pending.add(path)
+        return True
+
+    def scan(self):
+        """Offer every file in the watch directory, oldest first."""
+        try:
+            entries = [e for e in os.scandir(self.watch_dir) if e.is_file()]
+        except OSError as e:
+            print(f"Error scanning {self.watch_dir}: {e}")
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        # Keep the ledger cache bounded by the directory: forget files that were moved or deleted
+        paths = {e.path for e in entries}
+        with self.lock:
+            self.seen = {key for key in self.seen if key[0] in paths}
+        for entry in entries:
+            if not self._offer(entry.path):
+                break
+
+    def _watch(self):
+        next_scan = 0.0
+        inotify = None
+        if INOTIFY_AVAILABLE:
+            inotify = INotify()
+            inotify.add_watch(self.watch_dir, flags.CLOSE_WRITE | flags.MOVED_TO)
+            print(f"👀 Watching {self.watch_dir} (inotify + rescan every {RESCAN_SECONDS:.0f}s)")
+        else:
+            print(f"👀 Watching {self.watch_dir} (polling every {POLL_SECONDS:.0f}s)")
+
+        while not self.stop_event.is_set():
+            now = time.time()
+            # Rescan soon after a refused offer, once the worker has made room
+            if now >= next_scan or (self.backlogged and not self.queue.full()):
+                self.backlogged = False
+                self.scan()
+                next_scan = now + (RESCAN_SECONDS if inotify else POLL_SECONDS)
+            if inotify:
+                for event in inotify.read(timeout=int(POLL_SECONDS * 1000)):
+                    self._offer(os.path.join(self.watch_dir, event.name), settled=True)
+            else:
+                self.stop_event.wait(POLL_SECONDS)
+            self._report_stats()
+
+        if inotify:
+            inotify.close()
+
+    # ---------- processing ----------
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=BATCH_WAIT)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + BATCH_WAIT
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._process_batch(batch)
+
+    def _process_batch(self, batch):
+        frames = []     # (key, mtime, image, codes, lut, scale)
+        for key, mtime in batch:
+            try:
+                with open(key[0], "rb") as f:
+                    buf = image_io.read_upload(f)
+                frames.append((key, mtime) + image_io.decode_upload(buf))
+            except Exception as e:
+                print(f"Error reading {key[0]}: {e}")
+                self._finish(key, mtime, "failed", None)
+
+        # One model version for the whole batch, even if a hot-swap happens meanwhile
+        model = model_registry.production()
+        present = []
+        for key, mtime, image, codes, lut, scale in frames:
+            try:
+                present.append(detect_and_classify.passes_prefilter(codes, lut=lut))
+            except Exception as e:
+                print(f"Prefilter failed on {key[0]}, running detection: {e}")
+                present.append(True)
+        try:
+            detections = iter(detect_and_classify.run_detection_batch(
+                [f[2] for f, p in zip(frames, present) if p], model=model.model))
+        except Exception as e:
+            # Retry frame by frame so one bad frame only fails itself
+            print(f"Batch detection failed, processing {len(frames)} frames individually: {e}")
+            detections = None
+
+        for (key, mtime, image, codes, lut, scale), is_present in zip(frames, present):
+            try:
+                if not is_present:
+                    found = detect_and_classify.empty_detections()
+                elif detections is None:
+                    found = None    # detect_and_classify runs detection for this frame alone
+                else:
+                    found = next(detections)
+                # The prefilter already ran (and was counted) above
+                _, classification, temperatures = detect_and_classify.detect_and_classify(
+                    image, prefilter=False, temp_array=codes, lut=lut, temp_scale=scale,
+                    detections=found, model=model)
+                readings = [t for t in (temperatures.get('head'), temperatures.get('body')) if t is not None]
+                result_id = database.save_result(os.path.basename(key[0]),
+                                                 max(readings) if readings else 0, classification,
+                                                 model_version=model.version)
+                self._finish(key, mtime, "done", result_id)
+            except Exception as e:
+                print(f"Error processing {key[0]}: {e}")
+                self._finish(key, mtime, "failed", None)
+
+    def _finish(self, key, mtime, status, result_id):
+        lag = time.time() - mtime
+        _record(key, status, result_id, lag)
+
+        target_dir = self.done_dir if status == "done" else self.failed_dir
+        if target_dir:
+            try:
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(key[0], _unique_path(target_dir, os.path.basename(key[0])))
+            except OSError as e:
+                print(f"Could not move {key[0]}: {e}")
+
+        with self.lock:
+            self.seen.add(key)
+            self.pending.discard(key[0])
+            self.lags.append(lag)
+            self.processed += 1
+
+    def _report_stats(self):
+        now = time.time()
+        if now - self.last_stats < STATS_SECONDS:
+            return
+        with self.lock:
+            lags, self.lags = self.lags, []
+            processed = self.processed
+        self.last_stats = now
+        prefilter = detect_and_classify.get_prefilter_stats()
+        skipped = (f", prefilter skipped {prefilter['skipped']}/{prefilter['frames']} "
+                   f"({prefilter['skip_rate']*100:.1f}%)")
+        if lags:
+            print(f"📊 Ingest: {processed} files total, {len(lags)} in last {STATS_SECONDS:.0f}s, "
+                  f"lag avg {sum(lags)/len(lags):.1f}s / max {max(lags):.1f}s, "
+                  f"queue {self.queue.qsize()}/{self.queue.maxsize}{skipped}")
+        else:
+            print(f"📊 Ingest: idle, {processed} files total, queue {self.queue.qsize()}/{self.queue.maxsize}{skipped}")
+
+    # ---------- lifecycle ----------
+    def run(self):
+        worker = threading.Thread(target=self._work, name="ingest-worker", daemon=True)
+        worker.start()
+        try:
+            self._watch()
+        finally:
+            self.stop_event.set()
+            worker.join()
+            print(f"🛑 Ingest stopped after {self.processed} files")
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest camera frames dropped into a directory")
+    parser.add_argument("watch_dir")
+    parser.add_argument("--done-dir", help="move processed files here (default: leave in place, "
+                                           "which makes every rescan list all of them)")
+    parser.add_argument("--failed-dir", help="move unreadable files here (default: --done-dir)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    args = parser.parse_args()
+
+    daemon = IngestDaemon(args.watch_dir, done_dir=args.done_dir, failed_dir=args.failed_dir,
+                          batch_size=args.batch_size, queue_size=args.queue_size)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
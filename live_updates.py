@@ -0,0 +1,160 @@
+# ==========================================================
+# 📡 LIVE DASHBOARD UPDATES
+# Keeps dashboard counters in memory and pushes deltas to
+# Server-Sent Events subscribers as results are saved/deleted
+# ==========================================================
+import json
+import queue
+import sqlite3
+import threading
+from collections import deque
+
+import database
+
+SUBSCRIBER_QUEUE_SIZE = 100   # events buffered per open dashboard
+KEEPALIVE_SECONDS = 15        # comment line sent when nothing happened
+RECENT_ALERTS = 3
+
+_lock = threading.Lock()
+_subscribers = []
+_state = None                 # built lazily from the database on first use
+_version_conn = None
+_data_version = None
+
+
+def _alert(row):
+    return {
+        'date': row[4],
+        'chicken_id': f'CHK_{row[0]}',
+        'status': row[3],
+        'id': str(row[0])
+    }
+
+
+def _load_state():
+    counts = database.get_result_counts()
+    recent = database.get_recent_results(RECENT_ALERTS)
+    return {
+        'counts': counts,
+        'total': sum(counts.values()),
+        'recent': deque(recent, maxlen=RECENT_ALERTS),
+        'last_id': recent[0][0] if recent else 0,    # newest row already counted
+    }
+
+
+def _ensure_state():
+    global _state
+    if _state is None:
+        _state = _load_state()
+    return _state
+
+
+def _summary(state):
+    healthy = state['counts'].get('Healthy', 0)
+    sick = state['counts'].get('Suspected Bird Flu', 0)
+    return {
+        'stats': {
+            'healthy': healthy,
+            'sick': sick,
+            'total': state['total']
+        },
+        'recent_alerts': [_alert(r) for r in state['recent']],
+        'distribution': {
+            'healthy': healthy,
+            'sick': sick
+        }
+    }
+
+
+def snapshot():
+    """Current dashboard counters and recent alerts, without scanning the table."""
+    # Polling clients have no stream to pick up writes from other processes
+    check_external_changes()
+    with _lock:
+        return _summary(_ensure_state())
+
+
+def _publish(event, payload):
+    message = f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    for q in list(_subscribers):
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            # Slow client: drop it, EventSource reconnects and gets a fresh snapshot
+            _unsubscribe(q)
+
+
+def _on_result_change(event, row):
+    global _state
+    with _lock:
+        state = _ensure_state()
+        label = row[3]
+        # The listener runs after the commit, so a load in between (first use, or
+        # check_external_changes from a poll/keepalive) may already include this change
+        if event == 'saved' and row[0] > state['last_id']:
+            state['counts'][label] = state['counts'].get(label, 0) + 1
+            state['total'] += 1
+            state['recent'].appendleft(row)
+            state['last_id'] = row[0]
+        elif event == 'deleted':
+            # Deletes are rare and can't be told apart from an already-applied one: re-read
+            _state = state = _load_state()
+
+        payload = _summary(state)
+        payload['change'] = {'type': event, 'record': _alert(row)}
+        _publish('delta', payload)
+
+
+def check_external_changes():
+    """
+    Pick up writes made by other processes (e.g. a separate ingestion worker).
+
+    PRAGMA data_version only changes when another connection commits, so this
+    is a cheap no-op for idle databases and only re-aggregates when needed.
+    """
+    global _version_conn, _data_version, _state
+    with _lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(database.DB_NAME, check_same_thread=False)
+        version = _version_conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == _data_version:
+            return
+        first_check = _data_version is None
+        _data_version = version
+        if first_check or _state is None:
+            return
+
+        fresh = _load_state()
+        if fresh['counts'] == _state['counts'] and list(fresh['recent']) == list(_state['recent']):
+            return
+        _state = fresh
+        _publish('snapshot', _summary(_state))
+
+
+def _unsubscribe(q):
+    if q in _subscribers:
+        _subscribers.remove(q)
+
+
+def stream():
+    """Generator of SSE messages: an initial snapshot, then deltas as they happen."""
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        _subscribers.append(q)
+        initial = _summary(_ensure_state())
+    try:
+        yield f"event: snapshot\ndata: {json.dumps(initial)}\n\n"
+        # Ends the response once _publish has dropped this subscriber as too slow
+        while q in _subscribers:
+            try:
+                message = q.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                check_external_changes()
+                message = ": keepalive\n\n"
+            yield message
+    finally:
+        with _lock:
+            _unsubscribe(q)
+
+
+database.add_listener(_on_result_change)
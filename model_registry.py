@@ -0,0 +1,337 @@
+# ==========================================================
+# 🧠 MODEL REGISTRY
+# Versioned YOLO weights, zero-downtime hot-swap of the production
+# model and shadow evaluation of a candidate on sampled live traffic.
+#
+# Usage:
+#   python model_registry.py list
+#   python model_registry.py register runs/detect/yolov8_parts16/weights/best.pt --version v2
+#   python model_registry.py shadow v2 0.1       # run v2 on 10% of traffic, off the critical path
+#   python model_registry.py shadow off
+#   python model_registry.py promote v2          # running servers pick it up within seconds
+# ==========================================================
+import hashlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import database
+
+REGISTRY_DIR = "models"
+REGISTRY_FILE = os.path.join(REGISTRY_DIR, "registry.json")
+DEFAULT_VERSION = "yolov8_parts"
+DEFAULT_WEIGHTS = "runs/detect/yolov8_parts/weights/best.pt"
+RELOAD_CHECK_SECONDS = 5.0     # how often servers look for a changed registry.json
+SHADOW_MAX_PENDING = 4         # shadow jobs beyond this are dropped, never queued behind live traffic
+WARMUP_SIZE = 640
+
+LoadedModel = namedtuple("LoadedModel", ["version", "model"])
+
+_lock = threading.Lock()
+_production = None             # LoadedModel; replaced atomically, never mutated
+_shadow = None                 # LoadedModel or None
+_shadow_sample_rate = 0.0
+_registry_mtime = None
+_last_check = 0.0
+_loading = False
+_shadow_pending = 0
+_shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-model")
+_shadow_stats = {"runs": 0, "disagreements": 0, "dropped": 0,
+                 "production_latency": 0.0, "shadow_latency": 0.0}
+
+
+# ------------------------------------------
+# 1️⃣ Registry file
+# ------------------------------------------
+def _read_registry():
+    if not os.path.exists(REGISTRY_FILE):
+        return {"production": DEFAULT_VERSION, "shadow": None, "shadow_sample_rate": 0.0}
+    with open(REGISTRY_FILE) as f:
+        return json.load(f)
+
+
+def _write_registry(registry):
+    # Write-then-rename so readers never see a half-written file
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp_path = REGISTRY_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp_path, REGISTRY_FILE)
+
+
+def weights_path(version):
+    if version == DEFAULT_VERSION:
+        return DEFAULT_WEIGHTS
+    return os.path.join(REGISTRY_DIR, version, "best.pt")
+
+
+def list_versions():
+    """Registered versions with their metadata, oldest first."""
+    versions = [{"version": DEFAULT_VERSION, "weights": DEFAULT_WEIGHTS}]
+    if os.path.isdir(REGISTRY_DIR):
+        for name in sorted(os.listdir(REGISTRY_DIR)):
+            meta_path = os.path.join(REGISTRY_DIR, name, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    versions.append(json.load(f))
+    return versions
+
+
+def register(source_weights, version=None):
+    """Copy trained weights into the registry under a new version."""
+    with open(source_weights, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    version = version or f"v{datetime.now().strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+    target_dir = os.path.join(REGISTRY_DIR, version)
+    if os.path.exists(target_dir):
+        raise ValueError(f"Model version {version} already exists")
+    os.makedirs(target_dir)
+    shutil.copy2(source_weights, os.path.join(target_dir, "best.pt"))
+    meta = {
+        "version": version,
+        "weights": os.path.join(target_dir, "best.pt"),
+        "source": source_weights,
+        "sha256": digest,
+        "registered_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(target_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"✅ Registered model {version}")
+    return version
+
+
+def promote(version):
+    """Make version the production model (servers hot-swap on their next check)."""
+    if not os.path.exists(weights_path(version)):
+        raise ValueError(f"Unknown model version: {version}")
+    registry = _read_registry()
+    registry["production"] = version
+    if registry.get("shadow") == version:
+        registry["shadow"], registry["shadow_sample_rate"] = None, 0.0
+    _write_registry(registry)
+    print(f"🚀 Promoted {version} to production")
+
+
+def set_shadow(version, sample_rate=0.1):
+    """Run version on a sample of live traffic for comparison; version=None disables shadowing."""
+    if version is not None and not os.path.exists(weights_path(version)):
+        raise ValueError(f"Unknown model version: {version}")
+    registry = _read_registry()
+    registry["shadow"] = version
+    registry["shadow_sample_rate"] = float(sample_rate) if version else 0.0
+    _write_registry(registry)
+    print(f"👥 Shadow model: {version or 'off'}" + (f" on {sample_rate:.0%} of traffic" if version else ""))
+
+
+# ------------------------------------------
+# 2️⃣ Loading and hot-swap
+# ------------------------------------------
+def _load(version):
+    """Load and warm up weights so the first live request doesn't pay for it."""
+    from ultralytics import YOLO
+    model = YOLO(weights_path(version))
+    model(np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), dtype=np.uint8), verbose=False)
+    return LoadedModel(version, model)
+
+
+def _apply_registry(registry):
+    global _production, _shadow, _shadow_sample_rate
+    production, shadow = _production, _shadow
+
+    # Loading is slow, so it happens outside _lock; the old models keep serving meanwhile
+    if production is None or production.version != registry["production"]:
+        # Always a fresh instance, even when promoting the shadow version: the shadow
+        # instance may still be running on the shadow worker and YOLO predictors
+        # aren't safe to share between threads
+        production = _load(registry["production"])
+
+    wanted_shadow = registry.get("shadow")
+    if wanted_shadow is None:
+        shadow = None
+    elif shadow is None or shadow.version != wanted_shadow:
+        shadow = _load(wanted_shadow)
+
+    # Reference swaps only: requests in flight keep the LoadedModel they started with
+    with _lock:
+        if _production is None or production.version != _production.version:
+            print(f"✅ Production model: {production.version}")
+        _production, _shadow = production, shadow
+        _shadow_sample_rate = registry.get("shadow_sample_rate", 0.0) if shadow else 0.0
+
+
+def load_initial():
+    """Load production (and shadow) models at startup."""
+    global _registry_mtime
+    mtime = os.path.getmtime(REGISTRY_FILE) if os.path.exists(REGISTRY_FILE) else None
+    _apply_registry(_read_registry())
+    with _lock:
+        _registry_mtime = mtime
+
+
+def _reload_in_background(mtime):
+    global _registry_mtime, _loading
+    try:
+        _apply_registry(_read_registry())
+    except Exception as e:
+        print(f"❌ Model reload failed, keeping {_production.version}: {e}")
+    finally:
+        with _lock:
+            _registry_mtime = mtime     # also after a failure: don't retry a broken registry on every request
+            _loading = False
+
+
+def _check_for_changes():
+    global _last_check, _loading
+    now = time.time()
+    if now - _last_check < RELOAD_CHECK_SECONDS:
+        return
+    with _lock:
+        if now - _last_check < RELOAD_CHECK_SECONDS or _loading:
+            return
+        _last_check = now
+        mtime = os.path.getmtime(REGISTRY_FILE) if os.path.exists(REGISTRY_FILE) else None
+        if mtime == _registry_mtime:
+            return
+        _loading = True
+    # Load new weights off the request path; the old model keeps serving meanwhile
+    threading.Thread(target=_reload_in_background, args=(mtime,), daemon=True).start()
+
+
+def production():
+    """Current production LoadedModel; callers should use it for the whole request."""
+    if _production is None:
+        load_initial()
+    _check_for_changes()
+    return _production
+
+
+# ------------------------------------------
+# 3️⃣ Shadow evaluation
+# ------------------------------------------
+def init_shadow_log():
+    """Create the shadow evaluation log table if not existing."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS shadow_evaluations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        production_version TEXT NOT NULL,
+        shadow_version TEXT NOT NULL,
+        production_result TEXT NOT NULL,
+        shadow_result TEXT NOT NULL,
+        agree INTEGER NOT NULL,
+        body_iou REAL,
+        head_iou REAL,
+        production_latency REAL NOT NULL,
+        shadow_latency REAL NOT NULL
+    )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def submit_shadow(job):
+    """
+    Run job(shadow LoadedModel) on the shadow worker for a sample of requests.
+
+    Never blocks: if the worker is behind, the sample is dropped.
+    """
+    global _shadow_pending
+    shadow = _shadow
+    if shadow is None or random.random() >= _shadow_sample_rate:
+        return
+    with _lock:
+        if _shadow_pending >= SHADOW_MAX_PENDING:
+            _shadow_stats["dropped"] += 1
+            return
+        _shadow_pending += 1
+
+    def run():
+        global _shadow_pending
+        try:
+            job(shadow)
+        except Exception as e:
+            print(f"Shadow model error: {e}")
+        finally:
+            with _lock:
+                _shadow_pending -= 1
+
+    _shadow_executor.submit(run)
+
+
+def record_shadow(production_version, shadow_version, production_result, shadow_result,
+                  body_iou, head_iou, production_latency, shadow_latency):
+    """Log one production-vs-shadow comparison."""
+    agree = production_result == shadow_result
+    with _lock:
+        _shadow_stats["runs"] += 1
+        _shadow_stats["disagreements"] += 0 if agree else 1
+        _shadow_stats["production_latency"] += production_latency
+        _shadow_stats["shadow_latency"] += shadow_latency
+
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO shadow_evaluations (date, production_version, shadow_version, production_result,
+        shadow_result, agree, body_iou, head_iou, production_latency, shadow_latency)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), production_version, shadow_version,
+          production_result, shadow_result, int(agree), body_iou, head_iou,
+          production_latency, shadow_latency))
+    conn.commit()
+    conn.close()
+    if not agree:
+        print(f"👥 Shadow disagreement: {production_version}={production_result} "
+              f"vs {shadow_version}={shadow_result}")
+
+
+def status():
+    """Versions in use plus shadow disagreement rate and mean latency delta."""
+    with _lock:
+        stats = dict(_shadow_stats)
+    runs = stats["runs"]
+    return {
+        "production": _production.version if _production else None,
+        "shadow": _shadow.version if _shadow else None,
+        "shadow_sample_rate": _shadow_sample_rate,
+        "shadow_runs": runs,
+        "shadow_dropped": stats["dropped"],
+        "disagreement_rate": stats["disagreements"] / runs if runs else 0.0,
+        "latency_delta": (stats["shadow_latency"] - stats["production_latency"]) / runs if runs else 0.0,
+        "versions": list_versions(),
+    }
+
+
+init_shadow_log()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        current = _read_registry()
+        for meta in list_versions():
+            tags = [t for t in ("production", "shadow") if current.get(t) == meta["version"]]
+            print(f"{meta['version']:<32} {meta['weights']} {' '.join(tags)}")
+    elif command == "register":
+        version = sys.argv[sys.argv.index("--version") + 1] if "--version" in sys.argv else None
+        register(sys.argv[2], version)
+    elif command == "promote":
+        promote(sys.argv[2])
+    elif command == "shadow":
+        if sys.argv[2] == "off":
+            set_shadow(None)
+        else:
+            set_shadow(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 0.1)
+    else:
+        print("Commands: list, register <weights> [--version V], promote <V>, shadow <V> [rate] | shadow off")
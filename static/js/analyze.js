@@ -390,7 +390,8 @@ document.addEventListener('DOMContentLoaded', function () {
             details: [...observedSigns, `Interpretation: ${interpretation}`, ...recommendedActions],
             temperatures: window.latestAnalysisData ? window.latestAnalysisData.temperatures : undefined,
             average_temperature: window.latestAnalysisData ? window.latestAnalysisData.average_temperature : undefined,
-            confidence: window.latestAnalysisData ? window.latestAnalysisData.confidence : undefined
+            confidence: window.latestAnalysisData ? window.latestAnalysisData.confidence : undefined,
+            model_version: window.latestAnalysisData ? window.latestAnalysisData.model_version : undefined
         };
 
         // Send to backend API
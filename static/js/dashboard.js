@@ -38,10 +38,35 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeDashboard();
     setupEventListeners();
 
-    // Auto-refresh dashboard data every 60 seconds
-    setInterval(() => {
-        initializeDashboard();
-    }, 60000);
+    // Live updates: server pushes a snapshot on connect and deltas on save/delete.
+    // Falls back to polling every 60 seconds where EventSource is unavailable.
+    if (window.EventSource) {
+        connectLiveUpdates();
+    } else {
+        setInterval(() => {
+            initializeDashboard();
+        }, 60000);
+    }
+
+    function connectLiveUpdates() {
+        const source = new EventSource('/api/dashboard/stream');
+        const applyLiveData = (event) => {
+            try {
+                const data = JSON.parse(event.data);
+                updateStatisticsFromAPI(data);
+                updateDistributionChartFromAPI(data);
+                updateRecentAlertsFromAPI(data);
+            } catch (error) {
+                console.error('Error applying live dashboard update:', error);
+            }
+        };
+        source.addEventListener('snapshot', applyLiveData);
+        source.addEventListener('delta', applyLiveData);
+        source.onerror = () => {
+            // EventSource reconnects on its own and receives a fresh snapshot
+            console.warn('Dashboard live updates disconnected, retrying...');
+        };
+    }
 
     // Main entry: load analyses and update UI
     function initializeDashboard() {
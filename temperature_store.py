@@ -0,0 +1,272 @@
+# ==========================================================
+# 🌡️ PER-BIRD TEMPERATURE TIME-SERIES STORE
+# Append-only samples, in-memory ring buffers, hourly rollups
+# and streaming EWMA / z-score anomaly baselines
+# ==========================================================
+import sqlite3
+import threading
+import time
+import math
+from collections import deque
+
+import database
+
+# ------------------------------------------
+# Settings
+# ------------------------------------------
+RING_SIZE = 256                 # recent samples kept in memory per series
+ROLLUP_SECONDS = 3600           # hourly rollups
+RAW_RETENTION_DAYS = 7          # raw samples older than this are dropped
+ROLLUP_RETENTION_DAYS = 365     # rollups older than this are dropped
+RETENTION_CHECK_SECONDS = 3600  # how often add_sample enforces retention
+EWMA_ALPHA = 0.1                # weight of the newest sample in the baseline
+ANOMALY_Z = 3.0                 # |z| at or above this is flagged
+WARMUP_SAMPLES = 10             # no flags until the baseline has seen this many samples
+MIN_STD = 0.2                   # °C, floor so a flat history doesn't flag sensor noise
+
+_lock = threading.Lock()
+_series_ids = {}                # (pen_id, bird_id) -> series id
+_rings = {}                     # series id -> deque of (ts, temperature)
+_baselines = {}                 # series id -> [count, mean, var]
+_last_retention = 0.0
+
+
+# ------------------------------------------
+# 1️⃣ Schema
+# ------------------------------------------
+def init_store():
+    """Create time-series tables if not existing."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS temperature_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pen_id TEXT NOT NULL,
+        bird_id TEXT NOT NULL,
+        UNIQUE (pen_id, bird_id)
+    )
+    ''')
+    # Compact append-only rows: integer series id + epoch seconds + value
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS temperature_samples (
+        series_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        temperature REAL NOT NULL,
+        PRIMARY KEY (series_id, ts)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS temperature_rollups (
+        series_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        PRIMARY KEY (series_id, bucket)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS temperature_baselines (
+        series_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        var REAL NOT NULL
+    )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def _get_series_id(cursor, pen_id, bird_id):
+    """Series id for a bird, creating the series on its first sample."""
+    series_id = _find_series_id(cursor, pen_id, bird_id)
+    if series_id is not None:
+        return series_id
+    cursor.execute("INSERT OR IGNORE INTO temperature_series (pen_id, bird_id) VALUES (?, ?)",
+                   (str(pen_id), str(bird_id)))
+    return _find_series_id(cursor, pen_id, bird_id)
+
+
+def _find_series_id(cursor, pen_id, bird_id):
+    """Series id for a bird, or None if it has no samples yet (never creates anything)."""
+    key = (str(pen_id), str(bird_id))
+    series_id = _series_ids.get(key)
+    if series_id is not None:
+        return series_id
+
+    cursor.execute("SELECT id FROM temperature_series WHERE pen_id=? AND bird_id=?", key)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    series_id = row[0]
+    _series_ids[key] = series_id
+
+    # Warm the ring buffer and baseline from disk so restarts keep history
+    cursor.execute('''
+    SELECT ts, temperature FROM temperature_samples
+    WHERE series_id=? ORDER BY ts DESC LIMIT ?
+    ''', (series_id, RING_SIZE))
+    _rings[series_id] = deque(reversed(cursor.fetchall()), maxlen=RING_SIZE)
+
+    cursor.execute("SELECT count, mean, var FROM temperature_baselines WHERE series_id=?", (series_id,))
+    row = cursor.fetchone()
+    _baselines[series_id] = list(row) if row else [0, 0.0, 0.0]
+    return series_id
+
+
+# ------------------------------------------
+# 2️⃣ Streaming baseline (O(1) per sample)
+# ------------------------------------------
+def _update_baseline(baseline, value):
+    """Score value against the current EWMA baseline, then fold it in."""
+    count, mean, var = baseline
+    z_score = None
+    if count >= WARMUP_SAMPLES:
+        std = max(math.sqrt(var), MIN_STD)
+        z_score = (value - mean) / std
+
+    if count == 0:
+        mean, var = value, 0.0
+    else:
+        diff = value - mean
+        mean += EWMA_ALPHA * diff
+        var = (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * diff * diff)
+
+    baseline[0], baseline[1], baseline[2] = count + 1, mean, var
+    return z_score
+
+
+# ------------------------------------------
+# 3️⃣ Append Sample
+# ------------------------------------------
+def add_sample(bird_id, temperature, pen_id="default", ts=None):
+    """
+    Append one temperature reading for a bird and check it against its baseline.
+
+    A second reading for the same bird within the same second is rejected
+    (duplicate=True) and leaves the samples, rollups and baseline untouched.
+
+    Returns:
+        dict with z_score (None during warm-up), baseline mean/std, anomaly and duplicate flags
+    """
+    ts = int(ts if ts is not None else time.time())
+    temperature = float(temperature)
+    bucket = ts - ts % ROLLUP_SECONDS
+
+    with _lock:
+        conn = sqlite3.connect(database.DB_NAME)
+        cursor = conn.cursor()
+        series_id = _get_series_id(cursor, pen_id, bird_id)
+        baseline = _baselines[series_id]
+
+        cursor.execute('''
+        INSERT OR IGNORE INTO temperature_samples (series_id, ts, temperature)
+        VALUES (?, ?, ?)
+        ''', (series_id, ts, temperature))
+        duplicate = cursor.rowcount == 0
+        if duplicate:
+            conn.commit()
+            conn.close()
+            return _trend(bird_id, pen_id, temperature, None, baseline, False, True)
+
+        z_score = _update_baseline(baseline, temperature)
+        _rings[series_id].append((ts, temperature))
+        cursor.execute('''
+        INSERT INTO temperature_rollups (series_id, bucket, count, total, min, max)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT (series_id, bucket) DO UPDATE SET
+            count = count + 1,
+            total = total + excluded.total,
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max)
+        ''', (series_id, bucket, temperature, temperature, temperature))
+        cursor.execute('''
+        INSERT OR REPLACE INTO temperature_baselines (series_id, count, mean, var)
+        VALUES (?, ?, ?, ?)
+        ''', (series_id, baseline[0], baseline[1], baseline[2]))
+        conn.commit()
+        conn.close()
+
+    anomaly = z_score is not None and abs(z_score) >= ANOMALY_Z
+    if anomaly:
+        print(f"⚠️ Temperature anomaly: pen {pen_id} bird {bird_id} | {temperature:.1f}°C | z={z_score:.2f}")
+
+    _maybe_enforce_retention()
+    return _trend(bird_id, pen_id, temperature, z_score, baseline, anomaly, False)
+
+
+def _trend(bird_id, pen_id, temperature, z_score, baseline, anomaly, duplicate):
+    return {
+        "bird_id": str(bird_id),
+        "pen_id": str(pen_id),
+        "temperature": temperature,
+        "z_score": z_score,
+        "baseline_mean": baseline[1],
+        "baseline_std": math.sqrt(baseline[2]),
+        "anomaly": anomaly,
+        "duplicate": duplicate,
+    }
+
+
+# ------------------------------------------
+# 4️⃣ Read History
+# ------------------------------------------
+def get_recent(bird_id, pen_id="default"):
+    """Recent (ts, temperature) samples from the in-memory ring buffer ([] for unknown birds)."""
+    with _lock:
+        conn = sqlite3.connect(database.DB_NAME)
+        series_id = _find_series_id(conn.cursor(), pen_id, bird_id)
+        conn.close()
+        return list(_rings[series_id]) if series_id is not None else []
+
+
+def get_rollups(bird_id, pen_id="default", since=None):
+    """Hourly rollups as (bucket, count, mean, min, max), oldest first."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT r.bucket, r.count, r.total / r.count, r.min, r.max
+    FROM temperature_rollups r
+    JOIN temperature_series s ON s.id = r.series_id
+    WHERE s.pen_id=? AND s.bird_id=? AND r.bucket >= ?
+    ORDER BY r.bucket
+    ''', (str(pen_id), str(bird_id), int(since or 0)))
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+
+# ------------------------------------------
+# 5️⃣ Retention
+# ------------------------------------------
+def enforce_retention(now=None):
+    """Drop raw samples and rollups past their retention windows."""
+    now = int(now if now is not None else time.time())
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM temperature_samples WHERE ts < ?", (now - RAW_RETENTION_DAYS * 86400,))
+    raw_deleted = cursor.rowcount
+    cursor.execute("DELETE FROM temperature_rollups WHERE bucket < ?", (now - ROLLUP_RETENTION_DAYS * 86400,))
+    rollups_deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    print(f"🗑️ Retention: removed {raw_deleted} samples, {rollups_deleted} rollups")
+    return raw_deleted, rollups_deleted
+
+
+def _maybe_enforce_retention():
+    """Run enforce_retention at most once per RETENTION_CHECK_SECONDS."""
+    global _last_retention
+    now = time.time()
+    with _lock:
+        if now - _last_retention < RETENTION_CHECK_SECONDS:
+            return
+        _last_retention = now
+    enforce_retention(now)
+
+
+# ------------------------------------------
+# Auto initialize tables on import
+# ------------------------------------------
+init_store()
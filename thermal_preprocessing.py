@@ -1,16 +1,40 @@
+import os
+import tempfile
+
 import cv2
 import numpy as np
-from thermal_utils import extract_temperature_flir
+from thermal_utils import (FLIRPY_AVAILABLE, extract_temperature_flir, estimate_temperature_from_gray,
+                           histogram_percentile)
 
-def extract_pixel_temperatures(image_input):
+# Warm-presence prefilter settings (run on a downsampled temperature map)
+PREFILTER_WIDTH = 80                 # downsampled width in pixels
+PREFILTER_WARM_TEMP = 38.0           # °C, pixels at/above this count as "warm"
+PREFILTER_MIN_WARM_FRACTION = 0.01   # of downsampled pixels
+PREFILTER_MIN_BLOB_FRACTION = 0.005  # largest warm blob must cover this much of the frame
+
+TEMP_RANGE = 10.0  # °C spanned by the 8-bit intensity scale
+
+
+def temperature_lut(avg_temp, temp_range=TEMP_RANGE):
+    """256-entry lookup table mapping 8-bit intensity to °C around avg_temp."""
+    temp_min = avg_temp - temp_range/2
+    # Normalize: dark = cool, bright = warm (no inversion needed)
+    return (temp_min + np.arange(256, dtype=np.float32) / 255.0 * temp_range).astype(np.float32)
+
+
+def extract_pixel_codes(image_input):
     """
-    Extract pixel-wise temperature array from thermal image.
+    Extract the 8-bit thermal intensities and their temperature lookup table.
+
+    Keeping the frame as uint8 codes avoids a float32 copy of every frame;
+    lut[codes] gives the same values as extract_pixel_temperatures().
 
     Args:
         image_input: Path to thermal image or numpy array
 
     Returns:
-        temp_array: 2D numpy array of temperatures
+        codes: 2D uint8 array of intensities
+        lut: float32 array of 256 temperatures, indexed by intensity
     """
     # For FLIR images, we need to extract the temperature data
     # This is a simplified version - in practice, you'd use flirpy or similar
@@ -27,25 +51,144 @@ def extract_pixel_temperatures(image_input):
                 image = cv2.cvtColor(image_input, cv2.COLOR_BGR2GRAY)
             else:
                 image = image_input
+            if image.dtype != np.uint8:
+                image = np.clip(image, 0, 255).astype(np.uint8)
             # For array, use a default avg_temp or estimate
             avg_temp = np.mean(image) / 255 * 10 + 35  # Rough estimate
 
         if image is None:
-            return np.full((100, 100), 37.0)  # Default temperature
+            return _default_codes()
 
         # Normalize image intensity to temperature range
         # Assuming darker areas are cooler, brighter are warmer
-        temp_range = 10.0  # 10°C range
-        temp_min = avg_temp - temp_range/2
-        temp_max = avg_temp + temp_range/2
+        return image, temperature_lut(avg_temp)
+
+    except Exception as e:
+        print(f"Error extracting temperatures: {e}")
+        return _default_codes()
 
-        # Normalize: dark = cool, bright = warm (no inversion needed)
-        normalized = image.astype(np.float32) / 255.0
-        temp_array = temp_min + normalized * temp_range
 
-        return temp_array
+def extract_pixel_codes_from_gray(gray):
+    """
+    Same as extract_pixel_codes(path) for an already decoded 8-bit grayscale frame.
 
+    Without flirpy the estimate is computed in memory. With flirpy the frame is
+    written to a temporary file and read through extract_temperature_flir(),
+    like the path version does.
+    """
+    try:
+        if not FLIRPY_AVAILABLE:
+            return gray, temperature_lut(estimate_temperature_from_gray(gray))
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
+            temp_path = temp_file.name
+        try:
+            cv2.imwrite(temp_path, gray)
+            return gray, temperature_lut(extract_temperature_flir(temp_path))
+        finally:
+            os.unlink(temp_path)
     except Exception as e:
         print(f"Error extracting temperatures: {e}")
-        # Return default array
-        return np.full((100, 100), 37.0)
+        return _default_codes()
+
+
+def _default_codes():
+    # Every code maps to the default temperature
+    return np.zeros((100, 100), dtype=np.uint8), np.full(256, 37.0, dtype=np.float32)
+
+
+def extract_pixel_temperatures(image_input):
+    """
+    Extract pixel-wise temperature array from thermal image.
+
+    Args:
+        image_input: Path to thermal image or numpy array
+
+    Returns:
+        temp_array: 2D numpy array of temperatures
+    """
+    codes, lut = extract_pixel_codes(image_input)
+    return lut[codes]
+
+
+def region_stats(region, lut=None, percentiles=()):
+    """
+    Mean/min/max and percentiles of a temperature region.
+
+    With lut, region holds uint8 codes and everything is computed from a
+    256-bin np.bincount histogram instead of sorting the pixels.
+    Without lut, region is already in °C (float path).
+
+    Returns:
+        dict with mean, min, max and one key per percentile, or None if empty
+    """
+    if region is None or region.size == 0:
+        return None
+
+    if lut is None:
+        stats = {"mean": float(np.mean(region)), "min": float(np.min(region)), "max": float(np.max(region))}
+        for p in percentiles:
+            stats[p] = float(np.percentile(region, p))
+        return stats
+
+    hist = np.bincount(region.ravel(), minlength=256)
+    occupied = np.flatnonzero(hist)
+    stats = {
+        "mean": float(hist @ lut) / region.size,
+        "min": float(lut[occupied[0]]),
+        "max": float(lut[occupied[-1]]),
+    }
+    for p in percentiles:
+        stats[p] = histogram_percentile(hist, lut, p)
+    return stats
+
+
+def detect_warm_presence(temp_array,
+                         lut=None,
+                         warm_temp=PREFILTER_WARM_TEMP,
+                         min_warm_fraction=PREFILTER_MIN_WARM_FRACTION,
+                         min_blob_fraction=PREFILTER_MIN_BLOB_FRACTION,
+                         width=PREFILTER_WIDTH):
+    """
+    Cheap check for a warm, body-sized blob before running the detector.
+
+    Args:
+        temp_array: 2D temperature array from extract_pixel_temperatures(),
+            or uint8 codes from extract_pixel_codes() when lut is given
+        lut: Optional 256-entry lookup table for uint8 codes
+        warm_temp: Temperature (°C) a pixel must reach to count as warm
+        min_warm_fraction: Minimum fraction of warm pixels in the frame
+        min_blob_fraction: Minimum area of the largest warm blob, as a fraction of the frame
+        width: Width the temperature map is downsampled to
+
+    Returns:
+        present: True if the frame may contain a chicken
+        stats: dict with warm_fraction and blob_fraction
+    """
+    if temp_array is None or temp_array.size == 0:
+        return False, {"warm_fraction": 0.0, "blob_fraction": 0.0}
+
+    h, w = temp_array.shape[:2]
+    if w > width:
+        small_h = max(1, int(round(h * width / w)))
+        source = temp_array if lut is not None else temp_array.astype(np.float32)
+        small = cv2.resize(source, (width, small_h), interpolation=cv2.INTER_AREA)
+    else:
+        small = temp_array
+
+    if lut is not None:
+        # Compare codes against the first code whose temperature reaches warm_temp
+        warm = (small >= np.searchsorted(lut, warm_temp, side='left')).astype(np.uint8)
+    else:
+        warm = (small >= warm_temp).astype(np.uint8)
+    total = warm.size
+    warm_fraction = float(np.count_nonzero(warm)) / total
+
+    blob_fraction = 0.0
+    if warm_fraction >= min_warm_fraction:
+        num_labels, _, stats, _ = cv2.connectedComponentsWithStats(warm, connectivity=8)
+        if num_labels > 1:
+            # Label 0 is the background
+            blob_fraction = float(np.max(stats[1:, cv2.CC_STAT_AREA])) / total
+
+    present = warm_fraction >= min_warm_fraction and blob_fraction >= min_blob_fraction
+    return present, {"warm_fraction": warm_fraction, "blob_fraction": blob_fraction}
@@ -34,15 +34,41 @@ def extract_temperature_flir(image_path):
         img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise RuntimeError(f"Failed to read image file: {image_path}")
-        norm = img.astype(np.float32) / 255.0
-        # Adjusted range for realistic chicken temperatures: 32-42°C
-        TEMP_MIN_FALLBACK = 32.0
-        TEMP_MAX_FALLBACK = 42.0
-        temp_map = norm * (TEMP_MAX_FALLBACK - TEMP_MIN_FALLBACK) + TEMP_MIN_FALLBACK
-        # Mask out low temperature pixels (background)
-        mask = temp_map > TEMP_MIN_FALLBACK
-        if np.any(mask):
-            max_temp = np.percentile(temp_map[mask], 95)
-        else:
-            max_temp = np.percentile(temp_map, 95)
-        return max_temp
+        return estimate_temperature_from_gray(img)
+
+
+def estimate_temperature_from_gray(img):
+    """
+    Fallback temperature estimate from an 8-bit grayscale thermal frame
+    (same result as extract_temperature_flir() without flirpy).
+    Returns maximum temperature in Celsius.
+    """
+    # Adjusted range for realistic chicken temperatures: 32-42°C
+    TEMP_MIN_FALLBACK = 32.0
+    TEMP_MAX_FALLBACK = 42.0
+    lut = TEMP_MIN_FALLBACK + np.arange(256, dtype=np.float32) / 255.0 * (TEMP_MAX_FALLBACK - TEMP_MIN_FALLBACK)
+    hist = np.bincount(img.ravel(), minlength=256)
+    # Mask out low temperature pixels (background): only code 0 maps to TEMP_MIN_FALLBACK
+    if np.any(hist[1:]):
+        hist[0] = 0
+    max_temp = histogram_percentile(hist, lut, 95)
+    return max_temp
+
+
+def histogram_percentile(hist, lut, percentile):
+    """
+    Percentile of 8-bit data from its 256-bin histogram, mapped through lut.
+
+    Matches np.percentile's default linear interpolation on lut[codes]
+    (lut must be non-decreasing) without sorting the pixels.
+    """
+    n = int(hist.sum())
+    if n == 0:
+        return None
+    cumulative = np.cumsum(hist)
+    k = percentile / 100.0 * (n - 1)
+    lo = int(np.floor(k))
+    hi = min(lo + 1, n - 1)
+    v_lo = lut[np.searchsorted(cumulative, lo, side='right')]
+    v_hi = lut[np.searchsorted(cumulative, hi, side='right')]
+    return float(v_lo + (v_hi - v_lo) * (k - lo))